@@ -11,11 +11,18 @@
 import os
 import re
 import time
+import threading
+import shutil
+import tempfile
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+from bs4 import BeautifulSoup, SoupStrainer
+from lxml import etree
+from urllib.parse import urljoin, urlsplit
 
 
 BUCKET_NAME = "cna-webfiles"
@@ -25,6 +32,12 @@ creds_file = os.path.join(os.path.dirname(__file__), "creds.txt")
 with open(creds_file) as f:
     ACCESS_KEY, SECRET_KEY = [v.strip() for v in f.readline().split(",")]
 s3 = boto3.client("s3",aws_access_key_id=ACCESS_KEY,aws_secret_access_key=SECRET_KEY)
+TRANSFER_CFG = TransferConfig(multipart_threshold=16 << 20, multipart_chunksize=16 << 20, max_concurrency=8, use_threads=True)
+SPOOL_SIZE = 32 << 20
+existing_keys = None
+keys_lock = threading.Lock()
+seen_lock = threading.Lock()
+seen_urls = set()
 
 
 BASE_URL        = "https://gis.gov.nl.ca/minesen/geofiles/"
@@ -34,6 +47,34 @@ EXTERNAL_PREFIX = "https://www.gov.nl.ca/iet/mines-geoscience-reports-maps-docs"
 
 MAX_RETRIES     = 3
 RETRY_DELAY     = 2
+MAX_WORKERS     = 16
+
+ANCHORS         = SoupStrainer('a')
+SEARCH_PARTS    = SoupStrainer('form')
+SEARCH_RE       = re.compile(r'javascript:onClick=submitForm', re.I)
+GOPAGE_RE       = re.compile(r'goPage\(\s*(\d+)')
+FILE_LINKS      = "a[href$='.pdf' i], a[href$='.zip' i]"
+FILE_EXT_RE     = re.compile(r'\.(?:pdf|zip)$', re.I)
+FORM_FIELDS     = "input[type=hidden][name]:not([name='']), input[type=text][name]:not([name='']), select[name]:not([name=''])"
+BASE_ROOT       = "{0}://{1}".format(*urlsplit(BASE_URL))
+SCHEME_RE       = re.compile(r'([A-Za-z][A-Za-z0-9+.-]*):')
+PLAIN_RE        = re.compile(r'/?[^\x00-\x20./?#:;](?:(?!//|/\.)[^\x00-\x20:?#;])*\Z')
+
+
+def resolve(href: str, base: str = BASE_URL) -> str:
+    # Plain links skip urljoin; anything it would normalise still goes through it
+    if href.startswith('http'):
+        return href
+    scheme = SCHEME_RE.match(href)
+    if scheme and scheme.group(1).lower() not in ('http', 'https'):
+        return href
+    if PLAIN_RE.match(href):
+        if href[0] == '/':
+            if base == BASE_URL:
+                return BASE_ROOT + href
+        elif base[-1] == '/' and '?' not in base and '#' not in base and ';' not in base:
+            return base + href
+    return urljoin(base, href)
 
 
 def request_with_retry(session, method, url, timeout=None, **kwargs):
@@ -51,50 +92,144 @@ def request_with_retry(session, method, url, timeout=None, **kwargs):
     return None
 
 
+def first_visit(url: str) -> bool:
+    with seen_lock:
+        if url in seen_urls:
+            return False
+        seen_urls.add(url)
+    return True
+
+
+def forget(url: str):
+    with seen_lock:
+        seen_urls.discard(url)
+
+
+def list_existing_keys(prefix):
+    keys = set()
+    paginator = s3.get_paginator('list_objects_v2')
+    for p in paginator.paginate(Bucket=BUCKET_NAME, Prefix=prefix):
+        keys.update(o['Key'] for o in p.get('Contents', []))
+    return keys
+
+
+def claim_key(key):
+    # Falls back to head_object when the bucket listing wasn't available
+    if existing_keys is None:
+        try:
+            s3.head_object(Bucket=BUCKET_NAME, Key=key)
+            print(f"Skip: {key} already exists")
+            return False
+        except ClientError as e:
+            if e.response['Error']['Code'] != '404':
+                print(f"S3 head_object error for {key}: {e}")
+                return False
+        return True
+    with keys_lock:
+        if key in existing_keys:
+            print(f"Skip: {key} already exists")
+            return False
+        existing_keys.add(key)
+    return True
+
+
+def release_key(key):
+    if existing_keys is not None:
+        with keys_lock:
+            existing_keys.discard(key)
+
+
 def upload_stream(stream, key):
-    try:
-        s3.head_object(Bucket=BUCKET_NAME, Key=key)
-        print(f"Skip: {key} already exists")
-        return
-    except ClientError as e:
-        if e.response['Error']['Code'] != '404':
-            print(f"S3 head_object error for {key}: {e}")
-            return
     print(f"Uploading: {key}")
-    s3.upload_fileobj(stream, BUCKET_NAME, key)
+    # The raw body can't seek, so spool it first to let multipart send parts in parallel
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as tmp:
+        shutil.copyfileobj(stream, tmp, length=1 << 20)
+        tmp.seek(0)
+        s3.upload_fileobj(tmp, BUCKET_NAME, key, Config=TRANSFER_CFG)
 
 
 def download_file(session, url, prefix=S3_PREFIX):
+    if not first_visit(url):
+        return
     fname = os.path.basename(url)
     lname = fname.lower()
     if 'map' in lname or 'research' in lname:
         print(f"Skipping download of '{fname}' because filename contains filtered word.")
         return
+    key = f"{prefix}/{fname}"
+    if not claim_key(key):
+        return
     resp = request_with_retry(session, 'get', url, timeout=None, stream=True)
     if not resp:
+        release_key(key)
+        forget(url)
         return
     resp.raw.decode_content = True
-    key = f"{prefix}/{fname}"
-    upload_stream(resp.raw, key)
+    try:
+        with resp:
+            upload_stream(resp.raw, key)
+    except Exception as err:
+        release_key(key)
+        forget(url)
+        print(f"Error: upload of '{fname}' failed ({err}). Skipping.")
 
 
-def scrape_external(session, page_url, prefix=S3_PREFIX):
+def scrape_external(session, page_url):
     print(f"Scraping external page: {page_url}")
     resp = request_with_retry(session, 'get', page_url, timeout=None)
     if not resp:
-        return
-    soup = BeautifulSoup(resp.text, 'lxml')
-    for a in soup.find_all('a', href=True):
+        return []
+    soup = BeautifulSoup(resp.text, 'lxml', parse_only=ANCHORS)
+    urls = []
+    for a in soup.select(FILE_LINKS):
         link = a['href']
-        full = link if link.startswith('http') else urljoin(page_url, link)
-        if full.lower().endswith(('.pdf', '.zip')):
-            download_file(session, full, prefix)
+        urls.append(resolve(link, page_url))
+    return urls
+
+
+def page_links(source):
+    # One pass collects the links, the goSearch pager fields and the page count
+    files, external, pager, pages = [], [], None, None
+    for _, el in etree.iterparse(source, tag=('a', 'input'), html=True):
+        if el.tag == 'input':
+            form = next(el.iterancestors('form'), None)
+            if form is not None and form.get("name") == "goSearch":
+                if pager is None:
+                    pager = {}
+                if el.get("type") == "hidden" and el.get("name"):
+                    pager[el.get("name")] = el.get("value", "")
+            continue
+        url = el.get("href")
+        if pages is None and url and any('last.gif' in img.get("src", "") for img in el.iterchildren('img')):
+            m = GOPAGE_RE.search(url)
+            pages = int(m.group(1)) if m else 1
+        digital = "Digital Data" in "".join(el.itertext())
+        el.clear()
+        while el.getprevious() is not None:
+            del el.getparent()[0]
+        if not url:
+            continue
+        full = resolve(url)
+
+        # Digital Data ZIPs are files even without the extension
+        if digital or FILE_EXT_RE.search(full):
+            files.append(full)
+
+        elif full.startswith(EXTERNAL_PREFIX):
+            external.append(full)
+    return files, external, pager, pages or 1
 
 
 def scrape_to_s3(prefix=S3_PREFIX):
+    global existing_keys
     session = requests.Session()
     session.headers['User-Agent'] = 'PDF-Scraper/1.0'
+    session.mount('https://', HTTPAdapter(pool_maxsize=MAX_WORKERS))
     print("Starting Web Scraper... Please wait.")
+    try:
+        existing_keys = list_existing_keys(prefix)
+    except ClientError as e:
+        print(f"Could not list {BUCKET_NAME}/{prefix} ({e}), checking each file instead.")
 
 
     # Load search form
@@ -103,8 +238,8 @@ def scrape_to_s3(prefix=S3_PREFIX):
         print("Failed to load default.asp; aborting.")
         return
     
-    soup = BeautifulSoup(resp.text, 'lxml')
-    search_link = soup.find('a', class_='lg_link_blk', href=re.compile(r'javascript:onClick=submitForm', re.I))
+    soup = BeautifulSoup(resp.text, 'lxml', parse_only=SEARCH_PARTS)
+    search_link = soup.find('a', class_='lg_link_blk', href=SEARCH_RE)
     
     if not search_link:
         print("Search link not found on default.asp")
@@ -116,72 +251,71 @@ def scrape_to_s3(prefix=S3_PREFIX):
 
 
     # Build form payload
-    payload = {i["name"]: i.get("value","")
-               for i in form.find_all("input", type=["hidden","text"]) if i.get("name")}
-    
-    for sel in form.find_all("select"):
-        name = sel.get("name")
-        if not name:
-            continue
-        opt = sel.find("option", selected=True) or sel.find("option")
-        payload[name] = opt.get("value","") if opt else ""
-        payload[f"{name}_txt"] = opt.get_text(strip=True) if opt else ""
+    payload = {}
+    for field in form.select(FORM_FIELDS):
+        name = field["name"]
+        if field.name == "select":
+            opt = field.find("option", selected=True) or field.find("option")
+            payload[name] = opt.get("value","") if opt else ""
+            payload[f"{name}_txt"] = opt.get_text(strip=True) if opt else ""
+        else:
+            payload[name] = field.get("value","")
 
 
     # Submit search
-    resp = request_with_retry(session, "post", DISPLAY_URL, timeout=None, data=payload, headers={"Referer": DEFAULT_URL})
+    resp = request_with_retry(session, "post", DISPLAY_URL, timeout=None, data=payload, headers={"Referer": DEFAULT_URL}, stream=True)
     if not resp:
         print("Failed to load display.asp; aborting.")
         return
-    soup = BeautifulSoup(resp.text, "lxml")
+    resp.raw.decode_content = True
 
 
-    # Pagination
-    pager = soup.find("form", attrs={"name":"goSearch"})
-    if not pager:
+    # Page 1 links, pagination form and total pages
+    with resp:
+        try:
+            files, external, pager_payload, pages = page_links(resp.raw)
+        except Exception as e:
+            print(f"Failed to read display.asp ({e}); aborting.")
+            return
+    if pager_payload is None:
         print("Pagination form not found.")
         return
-    
-    pager_payload = {i["name"]: i.get("value","") 
-           for i in pager.find_all("input", type="hidden") if i.get("name")}
-    
-    
-    # Total Pages
-    last = soup.find('img', src=re.compile(r'last\.gif'))
-    pages = int(re.search(r'goPage\(\s*(\d+)', last.parent['href']).group(1)) if last else 1
 
 
     # Page loopings
-    for page in range(1, pages+1):
-        print(f"Page {page}/{pages}")
-        if page > 1:
-            params = pager_payload.copy()
-            params.update({"pageCt": str(page), "PK": "0"})
-            resp = request_with_retry(session, "post", DISPLAY_URL, timeout=None, data=params, headers={"Referer": DISPLAY_URL})
-            if not resp:
-                print(f"Failed to load page {page}.")
-                continue
-            soup = BeautifulSoup(resp.text, "lxml")
-
-
-        # Download PDFs and Follow External Links
-        for a in soup.find_all("a", href=True):
-            url = a["href"]
-            full = url if url.startswith("http") else urljoin(BASE_URL, url)
-            
-            if full.lower().endswith('.pdf'):
-                download_file(session, full, prefix)
-                
-            elif full.startswith(EXTERNAL_PREFIX):
-                scrape_external(session, full, prefix)
-
-
-        # Digital Data ZIPs
-        for a in soup.find_all("a", string=lambda t: t and "Digital Data" in t):
-            url = a["href"]
-            full = url if url.startswith("http") else urljoin(BASE_URL, url)
-            download_file(session, full, prefix)
-
+    pool = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+    try:
+        for page in range(1, pages+1):
+            print(f"Page {page}/{pages}")
+            if page > 1:
+                params = pager_payload.copy()
+                params.update({"pageCt": str(page), "PK": "0"})
+                resp = request_with_retry(session, "post", DISPLAY_URL, timeout=None, data=params, headers={"Referer": DISPLAY_URL}, stream=True)
+                if not resp:
+                    print(f"Failed to load page {page}.")
+                    continue
+                resp.raw.decode_content = True
+
+
+                # Download PDFs and Follow External Links, parsed as the page streams in
+                with resp:
+                    try:
+                        files, external, _, _ = page_links(resp.raw)
+                    except Exception as e:
+                        print(f"Failed to read page {page}: {e}")
+                        continue
+
+
+            # Fetch the whole page at once
+            ext_futures = [pool.submit(scrape_external, session, full) for full in external]
+            futures = [pool.submit(download_file, session, full, prefix) for full in files]
+            for fut in as_completed(ext_futures):
+                futures.extend(pool.submit(download_file, session, u, prefix) for u in fut.result())
+            for fut in futures:
+                fut.result()
+
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
     print('Finished Downloading. Files saved to', BUCKET_NAME, "directory.")
 
 if __name__ == '__main__':
@@ -47,15 +47,15 @@ def scrape_geofiles(title=None, pdf_only=True, out_dir="pdfs"):
 
 
     # Build payload
-    payload = {inp.get("name"): inp.get("value", "")
-               for inp in form.find_all("input", type=["hidden", "text"]) if inp.get("name")}
+    payload = {}
+    for field in form.select("input[type=hidden][name]:not([name='']), input[type=text][name]:not([name='']), select[name]:not([name=''])"):
+        if field.name == "select":
+            opt = field.find("option", selected=True) or field.find("option")
+            payload[field["name"]] = opt.get("value", "") if opt else ""
+        else:
+            payload[field["name"]] = field.get("value", "")
     if pdf_only:
         payload["FullText"] = "ON"
-    for sel in form.find_all("select"):
-        name = sel.get("name")
-        if name:
-            opt = sel.find("option", selected=True) or sel.find("option")
-            payload[name] = opt.get("value", "") if opt else ""
     if title:
         payload["title"] = title
 
@@ -70,14 +70,10 @@ def scrape_geofiles(title=None, pdf_only=True, out_dir="pdfs"):
     soup = BeautifulSoup(r.text, "html.parser")
 
 
-    # Download PDFs
-    for a in soup.select("a[href$='.pdf']"):
-        download_file(session, urljoin(BASE_URL, a['href']), out_dir)
-
-
-    # Download Digital Data ZIPs
-    for a in soup.find_all("a", string=lambda s: s and "Digital Data" in s):
-        download_file(session, urljoin(BASE_URL, a['href']), out_dir)
+    # Download PDFs and Digital Data ZIPs
+    for a in soup.find_all("a", href=True):
+        if a['href'].endswith('.pdf') or "Digital Data" in (a.string or ""):
+            download_file(session, urljoin(BASE_URL, a['href']), out_dir)
 
     print("Finished Downloading. Files saved to", out_dir, "directory.")
 
@@ -1,13 +1,22 @@
+import io
 import os
 import re
+import pickle
 import asyncio
 import threading
+import traceback
 import queue
-from urllib.parse import urljoin
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import cache
+from urllib.parse import urljoin, urlsplit
 from datetime import datetime
 
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from lxml import etree, html as lxml_html
 from playwright.async_api import (
     async_playwright,
     TimeoutError as PlaywrightTimeoutError,
@@ -29,15 +38,26 @@ XLSX_FILE      = "geomaster.xlsx"
 REQUEST_TIMEOUT= 500
 RESUME_FILE    = "resume.txt"
 MISSING_FILE   = "filenames.txt"
+MAX_WORKERS    = 16
+RESUME_EVERY   = 5
+LOG_BATCH      = 500
+RESULTS_SELECTOR = "form[name=goSearch]"
 
 log_queue   = queue.Queue()
 pause_event = threading.Event()
+missing_lock = threading.Lock()
+active_lock = threading.Lock()
+active_files = set()
+seen_lock = threading.Lock()
+pw_state = {}
+scrape_lock = None
+seen_urls = set()
 
 def gui_log(msg):
     log_queue.put(msg)
 
 def record_missing(name: str):
-    with open(MISSING_FILE, "a") as f:
+    with missing_lock, open(MISSING_FILE, "a") as f:
         f.write(f"{name}\n")
 
 def load_allowed_ids(path=XLSX_FILE):
@@ -45,26 +65,60 @@ def load_allowed_ids(path=XLSX_FILE):
         gui_log(f"Excel file not found: {path}")
         return set()
     wb = load_workbook(path, read_only=True, data_only=True)
-    sheet = wb.active
-    header = [cell.value for cell in next(sheet.iter_rows(min_row=1, max_row=1))]
-    idxs = { name: header.index(name) for name in (
-        'MasterNo','Geofile_No','MasterNo2','Geofile_No2','MasterNo3','Geofile_No3'
-    ) if name in header }
-    raw = set()
-    for row in sheet.iter_rows(min_row=2, values_only=True):
-        for idx in idxs.values():
-            if idx < len(row) and row[idx]:
-                raw.add(str(row[idx]).strip())
-    allowed = set()
-    for rid in raw:
-        allowed.add(rid)
-        if '/' in rid:
-            allowed.update({ rid.replace('/', '_'), rid.replace('/', '') })
-            parts = rid.split('/')
-            if len(parts) == 3:
-                allowed.update({ f"{parts[0]}_{parts[2]}", f"{parts[0]}{parts[2]}" })
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, ())
+        idxs = tuple( header.index(name) for name in (
+            'MasterNo','Geofile_No','MasterNo2','Geofile_No2','MasterNo3','Geofile_No3'
+        ) if name in header )
+        allowed = set()
+        for row in rows:
+            for idx in idxs:
+                if idx >= len(row) or not row[idx]:
+                    continue
+                rid = str(row[idx]).strip()
+                allowed.add(rid)
+                if '/' in rid:
+                    allowed.update({ rid.replace('/', '_'), rid.replace('/', '') })
+                    parts = rid.split('/')
+                    if len(parts) == 3:
+                        allowed.update({ f"{parts[0]}_{parts[2]}", f"{parts[0]}{parts[2]}" })
+    finally:
+        wb.close()
     return allowed
 
+def cached_allowed_ids(path=XLSX_FILE):
+    if not os.path.exists(path):
+        return load_allowed_ids(path)
+    st = os.stat(path)
+    tag = (st.st_mtime_ns, st.st_size)
+    cache = path + ".allowed.pkl"
+    try:
+        with open(cache, 'rb') as f:
+            cached_tag, ids = pickle.load(f)
+        if cached_tag == tag:
+            return ids
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        pass
+    ids = frozenset(load_allowed_ids(path))
+    try:
+        with open(cache, 'wb') as f:
+            pickle.dump((tag, ids), f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError as e:
+        gui_log(f"Could not write ID cache {cache}: {e}")
+    return ids
+
+def first_visit(url: str) -> bool:
+    with seen_lock:
+        if url in seen_urls:
+            return False
+        seen_urls.add(url)
+    return True
+
+def forget(url: str):
+    with seen_lock:
+        seen_urls.discard(url)
+
 def get_resume_page():
     if os.path.exists(RESUME_FILE):
         try:
@@ -73,11 +127,53 @@ def get_resume_page():
             return 1
     return 1
 
+def write_resume(i: int):
+    now = datetime.now()
+    with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(os.path.abspath(RESUME_FILE)), delete=False) as f:
+        f.write(f"{i}, time: {now:%I:%M %p}, date: {now:%Y-%m-%d}")
+    os.replace(f.name, RESUME_FILE)
+
+def split_ids(ids):
+    tokens, separated = set(), set()
+    for i in ids:
+        low = i.lower()
+        (tokens if TOKEN_RE.fullmatch(low) else separated).add(low)
+    return frozenset(tokens), frozenset(separated)
+
+def trie_pattern(words):
+    # Factor shared prefixes so the regex engine never retries a prefix
+    # it has already matched for a different ID.
+    trie = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+    def build(node):
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ''
+        body = alts[0] if len(alts) == 1 else '(?:' + '|'.join(alts) + ')'
+        return f'(?:{body})?' if '' in node else body
+    return build(trie)
+
+@cache
+def allowed_matcher():
+    tokens, separated = split_ids(cached_allowed_ids())
+    pattern = re.compile(
+        r'(?<![A-Za-z0-9])' + trie_pattern(separated) + r'(?![A-Za-z0-9])'
+        if separated else r'(?!)', re.IGNORECASE)
+    return tokens, pattern
+
 def is_allowed(url: str) -> bool:
-    name = os.path.basename(url)
-    return any(p.search(name) or p.search(url) for p in ALLOWED_PATTERNS)
+    tokens, pattern = allowed_matcher()
+    if any(t in tokens for t in TOKEN_RE.findall(url.lower())):
+        return True
+    return bool(pattern.search(url))
 
 def upload_to_s3(url: str):
+    if not first_visit(url):
+        return
     filename = os.path.basename(url)
     bold_name = f"**{filename}**"
 
@@ -89,99 +185,169 @@ def upload_to_s3(url: str):
     os.makedirs(downloads_dir, exist_ok=True)
     filepath = os.path.join(downloads_dir, filename)
 
-    if os.path.exists(filepath):
-        gui_log(f"Skipping {bold_name}, already downloaded locally.")
-        return
+    with active_lock:
+        if filepath in active_files or os.path.exists(filepath):
+            gui_log(f"Skipping {bold_name}, already downloaded locally.")
+            return
+        active_files.add(filepath)
 
     gui_log(f"Downloading: {bold_name}")
-    r = requests.get(url, stream=True,
-                     headers={'User-Agent': USER_AGENT},
-                     timeout=REQUEST_TIMEOUT)
-    r.raise_for_status()
-    with open(filepath, 'wb') as f:
-        for chunk in r.iter_content(chunk_size=8192):
-            if chunk:
-                f.write(chunk)
+    try:
+        with SESSION.get(url, stream=True, timeout=REQUEST_TIMEOUT) as r, open(filepath, 'wb') as f:
+            r.raise_for_status()
+            r.raw.decode_content = True
+            shutil.copyfileobj(r.raw, f, length=1 << 20)
+    except Exception as e:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        forget(url)
+        gui_log(f"Failed to download {bold_name}: {e}")
+        return
+    finally:
+        with active_lock:
+            active_files.discard(filepath)
 
     gui_log(f"Saved: {bold_name} to {downloads_dir}/")
 
+def fetch_external(full: str):
+    urls = []
+    try:
+        resp = SESSION.get(full, timeout=REQUEST_TIMEOUT)
+        resp.raise_for_status()
+        for link in lxml_html.fromstring(resp.content).xpath('//a/@href'):
+            u = resolve(link, full)
+            if FILE_EXT_RE.search(u):
+                urls.append(u)
+        if not urls:
+            mn = os.path.basename(full.rstrip('/'))
+            gui_log(f"No download for **{mn}**, logging.")
+            record_missing(mn)
+    except Exception as e:
+        gui_log(f"Error fetching external {full}: {e}")
+    return urls
+
+def resolve(href: str, base: str = BASE_URL) -> str:
+    # Plain links skip urljoin; anything it would normalise still goes through it
+    if href.startswith('http'):
+        return href
+    scheme = SCHEME_RE.match(href)
+    if scheme and scheme.group(1).lower() not in ('http', 'https'):
+        return href
+    if PLAIN_RE.match(href):
+        if href[0] == '/':
+            if base == BASE_URL:
+                return BASE_ROOT + href
+        elif base[-1] == '/' and '?' not in base and '#' not in base and ';' not in base:
+            return base + href
+    return urljoin(base, href)
+
+def iter_links(html: str, base: str):
+    try:
+        for _, a in etree.iterparse(io.BytesIO(html.encode()), tag='a', html=True, encoding='utf-8'):
+            href = a.get('href')
+            a.clear()
+            while a.getprevious() is not None:
+                del a.getparent()[0]
+            if href:
+                yield resolve(href, base)
+    except etree.XMLSyntaxError:
+        return
+
 def process(html: str):
-    soup = BeautifulSoup(html, 'lxml')
-    for a in soup.find_all('a', href=True):
-        href = a['href']
-        full = href if href.startswith('http') else urljoin(BASE_URL, href)
-        if full.lower().endswith(('.pdf', '.zip')):
-            upload_to_s3(full)
+    files, external = [], []
+    for full in iter_links(html, BASE_URL):
+        if FILE_EXT_RE.search(full):
+            files.append(full)
         elif full.startswith(EXTERNAL_PREFIX) and is_allowed(full):
-            got_files = False
-            try:
-                resp = requests.get(full,
-                                     headers={'User-Agent': USER_AGENT},
-                                     timeout=REQUEST_TIMEOUT)
-                resp.raise_for_status()
-                ext_soup = BeautifulSoup(resp.text, 'lxml')
-                for b in ext_soup.find_all('a', href=True):
-                    link = b['href']
-                    u = link if link.startswith('http') else urljoin(full, link)
-                    if u.lower().endswith(('.pdf', '.zip')):
-                        upload_to_s3(u)
-                        got_files = True
-                if not got_files:
-                    mn = os.path.basename(full.rstrip('/'))
-                    gui_log(f"No download for **{mn}**, logging.")
-                    record_missing(mn)
-            except Exception as e:
-                gui_log(f"Error fetching external {full}: {e}")
-
-
-ALLOWED_IDS = load_allowed_ids()
-ALLOWED_PATTERNS = [
-    re.compile(rf'(?<![A-Za-z0-9]){re.escape(i)}(?![A-Za-z0-9])',
-               re.IGNORECASE)
-    for i in ALLOWED_IDS
-]
-
-async def scraper_main():
+            external.append(full)
+
+    ext_futures = [EXECUTOR.submit(fetch_external, full) for full in external]
+    futures = [EXECUTOR.submit(upload_to_s3, u) for u in files]
+    for fut in as_completed(ext_futures):
+        futures.extend(EXECUTOR.submit(upload_to_s3, u) for u in fut.result())
+    for fut in futures:
+        fut.result()
+
+
+TOKEN_RE = re.compile(r'[A-Za-z0-9]+')
+GOPAGE_RE = re.compile(r"goPage\(\s*(\d+)")
+FILE_EXT_RE = re.compile(r'\.(?:pdf|zip)$', re.IGNORECASE)
+BASE_ROOT = "{0}://{1}".format(*urlsplit(BASE_URL))
+SCHEME_RE = re.compile(r'([A-Za-z][A-Za-z0-9+.-]*):')
+PLAIN_RE = re.compile(r'/?[^\x00-\x20./?#:;](?:(?!//|/\.)[^\x00-\x20:?#;])*\Z')
+SESSION = requests.Session()
+SESSION.headers.update({'User-Agent': USER_AGENT})
+ADAPTER = HTTPAdapter(pool_connections=10, pool_maxsize=2 * MAX_WORKERS,
+                      max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]))
+SESSION.mount('https://', ADAPTER)
+SESSION.mount('http://', ADAPTER)
+EXECUTOR = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+LOOP = asyncio.new_event_loop()
+threading.Thread(target=LOOP.run_forever, daemon=True).start()
+
+async def open_browser(pw):
+    browser = await pw.chromium.launch(headless=True, args=['--disable-gpu', '--disable-dev-shm-usage'])
+    context = await browser.new_context(user_agent=USER_AGENT)
+    return browser, await context.new_page()
+
+async def navigate(page, action):
+    async with page.expect_navigation(wait_until='domcontentloaded'):
+        await action()
+    await page.wait_for_selector(RESULTS_SELECTOR, state='attached')
+
+async def close_browser():
+    browser = pw_state.pop('browser', None)
+    if browser is not None:
+        try:
+            await browser.close()
+        except PlaywrightError:
+            pass
+
+async def get_page(restart=False):
+    if 'pw' not in pw_state:
+        pw_state['pw'] = await async_playwright().start()
+    browser = pw_state.get('browser')
+    if restart or browser is None or not browser.is_connected() or pw_state['page'].is_closed():
+        await close_browser()
+        pw_state['browser'], pw_state['page'] = await open_browser(pw_state['pw'])
+    return pw_state['page']
+
+async def scrape():
     open(MISSING_FILE, 'w').close()
+    seen_urls.clear()
+    allowed_matcher.cache_clear()
+    allowed_matcher()
     entry = urljoin(BASE_URL, ENTRY_PATH)
     gui_log("\n========================= ✓ Starting Scraper ✓ =========================\n")
     gui_log(f"🔗 Entering Webpage: {BASE_URL} 🔗\n")
-    async with async_playwright() as pw:
-        browser = await pw.chromium.launch(headless=False)
-        page = await browser.new_page(user_agent=USER_AGENT)
-
-        await page.goto(entry)
-        await page.wait_for_selector("form[name=searchForm]")
-        await page.wait_for_timeout(2000)
-        await page.evaluate("document.forms['searchForm'].submit()")
-        await page.wait_for_load_state('networkidle')
-        await page.wait_for_timeout(2000)
-
-        resume_page = get_resume_page()
-        if resume_page > 1:
-            gui_log(f"🔄 Resuming from page {resume_page} 🔄")
-            try:
-                await page.evaluate(f"goPage({resume_page}, 'display.asp')")
-            except PlaywrightError:
-                gui_log(f"⚠️ goPage not available for resuming at page {resume_page}")
-            await page.wait_for_load_state('networkidle')
-            await page.wait_for_timeout(2000)
-
-        soup0 = BeautifulSoup(await page.content(), 'lxml')
-        last = soup0.select_one("img[src*='last.gif']")
-        total = int(
-            re.search(r"goPage\(\s*(\d+)", last.parent['href']).group(1)
-            if last and last.parent and last.parent.has_attr('href') else 1
-        )
-        gui_log(f"📄 Total pages found: {total} 📄")
+    page = await get_page()
+
+    await page.goto(entry)
+    await page.wait_for_selector("form[name=searchForm]")
+    await navigate(page, lambda: page.evaluate("document.forms['searchForm'].submit()"))
+
+    resume_page = get_resume_page()
+    if resume_page > 1:
+        gui_log(f"🔄 Resuming from page {resume_page} 🔄")
+        try:
+            await navigate(page, lambda: page.evaluate(f"goPage({resume_page}, 'display.asp')"))
+        except PlaywrightError:
+            gui_log(f"⚠️ goPage not available for resuming at page {resume_page}")
 
+    last = lxml_html.fromstring(await page.content()).xpath("//img[contains(@src, 'last.gif')]/../@href")
+    total = int(GOPAGE_RE.search(last[0]).group(1) if last else 1)
+    gui_log(f"📄 Total pages found: {total} 📄")
+
+    pending = []
+    checkpoint = done_page = resume_page - 1
+    try:
         for i in range(resume_page, total + 1):
             gui_log(f"\nScraping Page: {i}/{total} \n")
 
             html = ""
             for attempt in range(2):
                 try:
-                    await page.wait_for_load_state('networkidle', timeout=15000)
+                    await page.wait_for_selector(RESULTS_SELECTOR, state='attached', timeout=15000)
                     html = await page.content()
                     break
                 except (PlaywrightTimeoutError, PlaywrightError) as e:
@@ -190,18 +356,18 @@ async def scraper_main():
                         await asyncio.sleep(2)
                     else:
                         gui_log(f"❌ Still failing to retrieve content for page {i}: {e}")
-            process(html)
-
-            now = datetime.now()
-            with open(RESUME_FILE, 'w') as f:
-                f.write(f"{i}, time: {now:%I:%M %p}, date: {now:%Y-%m-%d}")
+            pending.append((i, asyncio.create_task(asyncio.to_thread(process, html))))
+            if len(pending) > 2:
+                done_page, task = pending.pop(0)
+                await task
+                if done_page - checkpoint >= RESUME_EVERY:
+                    write_resume(done_page)
+                    checkpoint = done_page
 
             if i < total:
                 next_page = i + 1
                 try:
-                    await page.evaluate(f"goPage({next_page}, 'display.asp')")
-                    await page.wait_for_load_state('networkidle')
-                    await page.wait_for_timeout(2000)
+                    await navigate(page, lambda: page.evaluate(f"goPage({next_page}, 'display.asp')"))
                     continue
                 except PlaywrightError as e:
                     gui_log(f"⚠️ goPage eval failed for page {next_page}: {e}")
@@ -212,8 +378,7 @@ async def scraper_main():
                         href = await anchor.get_attribute('href')
                         nav_url = urljoin(BASE_URL, href)
                         await page.goto(nav_url)
-                        await page.wait_for_load_state('networkidle')
-                        await page.wait_for_timeout(2000)
+                        await page.wait_for_selector(RESULTS_SELECTOR, state='attached')
                         continue
                 except Exception as e:
                     gui_log(f"⚠️ Anchor href navigation failed for page {next_page}: {e}")
@@ -221,9 +386,7 @@ async def scraper_main():
                 try:
                     anchor = await page.query_selector("a:has(img[src*='next.gif'])")
                     if anchor:
-                        await anchor.click()
-                        await page.wait_for_load_state('networkidle')
-                        await page.wait_for_timeout(2000)
+                        await navigate(page, anchor.click)
                         continue
                 except Exception as e:
                     gui_log(f"⚠️ Anchor click fallback failed for page {next_page}: {e}")
@@ -231,39 +394,57 @@ async def scraper_main():
                 try:
                     gui_log(f"🔄 Reloading and retrying goPage for {next_page}")
                     await page.reload()
-                    await page.wait_for_timeout(2000)
-                    await page.evaluate(f"goPage({next_page}, 'display.asp')")
-                    await page.wait_for_load_state('networkidle')
-                    await page.wait_for_timeout(2000)
+                    await page.wait_for_selector(RESULTS_SELECTOR, state='attached')
+                    await navigate(page, lambda: page.evaluate(f"goPage({next_page}, 'display.asp')"))
                     continue
                 except Exception as e:
                     gui_log(f"❌ Reload fallback failed for page {next_page}: {e}")
 
+                try:
+                    gui_log(f"🔁 Re-entering search for page {next_page}")
+                    await page.goto(entry)
+                    await page.wait_for_selector("form[name=searchForm]")
+                    await navigate(page, lambda: page.evaluate("document.forms['searchForm'].submit()"))
+                    await navigate(page, lambda: page.evaluate(f"goPage({next_page}, 'display.asp')"))
+                    continue
+                except Exception as e:
+                    gui_log(f"❌ Re-entering search failed for page {next_page}: {e}")
+
                 try:
                     gui_log(f"♻️ Restarting browser for page {next_page}")
-                    await browser.close()
-                    browser = await pw.chromium.launch(headless=False)
-                    page = await browser.new_page(user_agent=USER_AGENT)
+                    page = await get_page(restart=True)
                     await page.goto(entry)
                     await page.wait_for_selector("form[name=searchForm]")
-                    await page.evaluate("document.forms['searchForm'].submit()")
-                    await page.wait_for_load_state('networkidle')
-                    await page.wait_for_timeout(2000)
-                    await page.evaluate(f"goPage({next_page}, 'display.asp')")
-                    await page.wait_for_load_state('networkidle')
-                    await page.wait_for_timeout(2000)
+                    await navigate(page, lambda: page.evaluate("document.forms['searchForm'].submit()"))
+                    await navigate(page, lambda: page.evaluate(f"goPage({next_page}, 'display.asp')"))
                     continue
                 except Exception as e:
                     gui_log(f"❌ Browser restart failed for page {next_page}: {e}")
 
                 gui_log(f"❌ Cannot navigate to page {next_page}, stopping.")
                 break
-
-        await browser.close()
+    finally:
+        for done_page, task in pending:
+            await task
+        if done_page > checkpoint:
+            write_resume(done_page)
     gui_log("======================= ✓ Scraping Complete ✓ =======================")
 
+async def scraper_main():
+    global scrape_lock
+    if scrape_lock is None:
+        scrape_lock = asyncio.Lock()
+    if scrape_lock.locked():
+        gui_log("Scraper already running, starting again once it finishes.")
+    async with scrape_lock:
+        try:
+            await scrape()
+        except Exception:
+            gui_log(f"Scraper stopped:\n{traceback.format_exc()}")
+            await close_browser()
+
 def run_scraper():
-    asyncio.run(scraper_main())
+    asyncio.run_coroutine_threadsafe(scraper_main(), LOOP)
 
 def start_gui():
     root = tk.Tk()
@@ -285,7 +466,7 @@ def start_gui():
         btn_frame,
         text="Start Scraper",
         font=("Georgia", 10),
-        command=lambda: threading.Thread(target=run_scraper, daemon=True).start()
+        command=run_scraper
     ).pack(side=tk.LEFT, padx=5, ipadx=20, ipady=10)
 
     tk.Button(
@@ -302,20 +483,25 @@ def start_gui():
     log_widget.pack(fill=tk.BOTH, expand=True)
 
     def update_log():
-        while not log_queue.empty():
-            msg = log_queue.get()
-            parts = msg.split('**')
-            log_widget.config(state='normal')
+        chunks = []
+        for _ in range(LOG_BATCH):
+            try:
+                parts = log_queue.get_nowait().split('**')
+            except queue.Empty:
+                break
             for idx, part in enumerate(parts):
-                tag = 'bold' if idx % 2 else None
-                log_widget.insert(tk.END, part, tag)
-            log_widget.insert(tk.END, '\n')
+                chunks += [part, 'bold' if idx % 2 else ()]
+            chunks += ['\n', ()]
+        if chunks:
+            log_widget.config(state='normal')
+            log_widget.insert(tk.END, *chunks)
             log_widget.see(tk.END)
             log_widget.config(state='disabled')
-        root.after(100, update_log)
+        root.after(10 if not log_queue.empty() else 100, update_log)
 
     root.after(100, update_log)
     root.mainloop()
+    EXECUTOR.shutdown(wait=False, cancel_futures=True)
 
 if __name__ == '__main__':
     start_gui()
\ No newline at end of file
@@ -1,20 +1,28 @@
 import os
 import re
+import pickle
 import asyncio
 import threading
+import traceback
 import queue
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import OrderedDict
 from urllib.parse import urljoin
 from datetime import datetime
 
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from lxml import html as lxml_html
 from playwright.async_api import (
     async_playwright,
     TimeoutError as PlaywrightTimeoutError,
     Error as PlaywrightError,
 )
 import boto3
-from botocore.exceptions import ClientError
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config as BotoConfig
 from openpyxl import load_workbook
 import tkinter as tk
 from tkinter import font as tkfont
@@ -33,15 +41,42 @@ XLSX_FILE      = "geomaster.xlsx"
 REQUEST_TIMEOUT= 500
 RESUME_FILE    = "resume.txt"
 MISSING_FILE   = "filenames.txt"
+PART_SIZE      = 8 << 20
+SPOOL_SIZE     = 32 << 20
+MAX_WORKERS    = 16
+S3_CONCURRENCY = 4
+RESULTS_SELECTOR = "form[name=goSearch]"
+LOG_BATCH      = 500
+SEEN_LIMIT     = 100_000
+BLOCKED_RESOURCES = ("image", "font", "stylesheet", "media")
+TOTAL_PAGES_JS = """() => {
+    const img = document.querySelector("a img[src*='last.gif']");
+    const m = img && (img.parentElement.getAttribute('href') || '').match(/goPage\\(\\s*(\\d+)/);
+    return m ? parseInt(m[1], 10) : 1;
+}"""
 
 log_queue = queue.Queue()
+missing_names = []
+missing_lock = threading.Lock()
+seen_urls = OrderedDict()
+seen_lock = threading.Lock()
+pw_state = {}
+scrape_lock = None
 
 def gui_log(msg):
     log_queue.put(msg)
 
 def record_missing(name: str):
-    with open(MISSING_FILE, "a") as f:
-        f.write(f"{name}\n")
+    with missing_lock:
+        missing_names.append(name)
+
+def flush_missing():
+    with missing_lock:
+        names = missing_names[:]
+        missing_names.clear()
+    if names:
+        with open(MISSING_FILE, "a") as f:
+            f.write("".join(f"{name}\n" for name in names))
 
 def load_credentials(path=CREDS_FILE):
     with open(path) as f:
@@ -53,25 +88,56 @@ def load_allowed_ids(path=XLSX_FILE):
         gui_log(f"Excel file not found: {path}")
         return set()
     wb = load_workbook(path, read_only=True, data_only=True)
-    sheet = wb.active
-    header = [cell.value for cell in next(sheet.iter_rows(min_row=1, max_row=1))]
-    idxs = { name: header.index(name) for name in (
-        'MasterNo','Geofile_No','MasterNo2','Geofile_No2','MasterNo3','Geofile_No3'
-    ) if name in header }
-    raw = set()
-    for row in sheet.iter_rows(min_row=2, values_only=True):
-        for idx in idxs.values():
-            if idx < len(row) and row[idx]: raw.add(str(row[idx]).strip())
-    allowed = set()
-    for rid in raw:
-        allowed.add(rid)
-        if '/' in rid:
-            allowed.update({ rid.replace('/', '_'), rid.replace('/', '') })
-            parts = rid.split('/')
-            if len(parts) == 3:
-                allowed.update({ f"{parts[0]}_{parts[2]}", f"{parts[0]}{parts[2]}" })
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, ())
+        idxs = tuple( header.index(name) for name in (
+            'MasterNo','Geofile_No','MasterNo2','Geofile_No2','MasterNo3','Geofile_No3'
+        ) if name in header )
+        allowed = set()
+        for row in rows:
+            for idx in idxs:
+                if idx >= len(row) or not row[idx]:
+                    continue
+                rid = str(row[idx]).strip()
+                allowed.add(rid)
+                if '/' in rid:
+                    allowed.update({ rid.replace('/', '_'), rid.replace('/', '') })
+                    parts = rid.split('/')
+                    if len(parts) == 3:
+                        allowed.update({ f"{parts[0]}_{parts[2]}", f"{parts[0]}{parts[2]}" })
+    finally:
+        wb.close()
     return allowed
 
+def cached_allowed_ids(path=XLSX_FILE):
+    if not os.path.exists(path):
+        return load_allowed_ids(path)
+    st = os.stat(path)
+    tag = (st.st_mtime_ns, st.st_size)
+    cache = path + ".allowed.pkl"
+    try:
+        with open(cache, 'rb') as f:
+            cached_tag, ids = pickle.load(f)
+        if cached_tag == tag:
+            return ids
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        pass
+    ids = frozenset(load_allowed_ids(path))
+    try:
+        with open(cache, 'wb') as f:
+            pickle.dump((tag, ids), f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError as e:
+        gui_log(f"Could not write ID cache {cache}: {e}")
+    return ids
+
+def list_existing_keys(prefix=FOLDER_PREFIX):
+    keys = set()
+    paginator = s3.get_paginator('list_objects_v2')
+    for p in paginator.paginate(Bucket=BUCKET_NAME, Prefix=prefix):
+        keys.update(o['Key'] for o in p.get('Contents', []))
+    return keys
+
 def get_resume_page():
     if os.path.exists(RESUME_FILE):
         try:
@@ -80,105 +146,243 @@ def get_resume_page():
             return 1
     return 1
 
-def is_allowed(url: str) -> bool:
-    name = os.path.basename(url)
-    return any(p.search(name) or p.search(url) for p in ALLOWED_PATTERNS)
+def write_resume(i: int):
+    now = datetime.now()
+    with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(os.path.abspath(RESUME_FILE)), delete=False) as f:
+        f.write(f"{i}, time: {now:%I:%M %p}, date: {now:%Y-%m-%d}")
+    os.replace(f.name, RESUME_FILE)
+
+def split_ids(ids):
+    tokens, separated = set(), set()
+    for i in ids:
+        low = i.lower()
+        (tokens if TOKEN_RE.fullmatch(low) else separated).add(low)
+    return frozenset(tokens), frozenset(separated)
+
+def trie_pattern(words):
+    # Factor shared prefixes so the regex engine never retries a prefix
+    # it has already matched for a different ID.
+    trie = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+    def build(node):
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ''
+        body = alts[0] if len(alts) == 1 else '(?:' + '|'.join(alts) + ')'
+        return f'(?:{body})?' if '' in node else body
+    return build(trie)
 
-def upload_to_s3(url: str):
-    filename = os.path.basename(url)
+def is_allowed(url: str) -> bool:
+    if any(t in ALLOWED_TOKENS for t in TOKEN_RE.findall(url.lower())):
+        return True
+    return bool(ALLOWED_PATTERN.search(url))
+
+def is_wanted(url: str, filename: str) -> bool:
+    if SKIP_RE.search(filename) or not is_allowed(url):
+        gui_log(f"Filtered out: **{filename}** not in database.")
+        return False
+    return True
+
+def checked_chunks(r, expected: int):
+    total = 0
+    for chunk in r.iter_content(chunk_size=1 << 20):
+        total += len(chunk)
+        yield chunk
+    if total == 0:
+        raise ValueError("empty response body")
+    if expected and total != expected:
+        raise ValueError(f"received {total} of {expected} bytes")
+
+def transfer(url: str, key: str):
+    with SESSION.get(url, stream=True, timeout=REQUEST_TIMEOUT) as r:
+        r.raise_for_status()
+        size = int(r.headers.get('Content-Length') or 0)
+        # iter_content decodes gzip, so only a raw body can be checked against the header
+        chunks = checked_chunks(r, 0 if r.headers.get('Content-Encoding') else size)
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as tmp:
+            for chunk in chunks:
+                tmp.write(chunk)
+            tmp.seek(0)
+            s3.upload_fileobj(tmp, BUCKET_NAME, key, Config=S3_TRANSFER_CFG)
+
+def upload_to_s3(url: str, filename: str = None):
+    filename = filename or url.rsplit('/', 1)[-1]
     bold_name = f"**{filename}**"
-    if any(kw in filename.lower() for kw in SKIP_KEYWORDS) or not is_allowed(url):
-        gui_log(f"Filtered out: {bold_name} not in database.")
-        return
     key = f"{FOLDER_PREFIX}/{filename}"
-    try:
-        s3.head_object(Bucket=BUCKET_NAME, Key=key)
-        gui_log(f"Skipping {bold_name} already exists in S3.")
-        return
-    except ClientError as e:
-        if e.response['Error']['Code'] != '404':
-            gui_log(f"S3 head error for {bold_name}: {e}")
+    with KEYS_LOCK:
+        if key in EXISTING_KEYS:
+            gui_log(f"Skipping {bold_name} already exists in S3.")
             return
+        EXISTING_KEYS.add(key)
     gui_log(f"Downloading: {bold_name}")
-    r = requests.get(url, stream=True, headers={'User-Agent':USER_AGENT}, timeout=REQUEST_TIMEOUT)
-    r.raise_for_status()
-    r.raw.decode_content = True
-    s3.upload_fileobj(r.raw, BUCKET_NAME, key)
+    try:
+        transfer(url, key)
+    except Exception as e:
+        with KEYS_LOCK:
+            EXISTING_KEYS.discard(key)
+        forget(url)
+        gui_log(f"Failed to upload {bold_name}: {e}")
+        return
     gui_log(f"Uploaded: {bold_name} to S3 ✓.")
 
-def process(html: str):
-    soup = BeautifulSoup(html, 'lxml')
-    for a in soup.find_all('a', href=True):
-        href = a['href']
+def external_files(full: str) -> tuple:
+    resp = SESSION.get(full, timeout=REQUEST_TIMEOUT)
+    resp.raise_for_status()
+    urls = []
+    for link in lxml_html.fromstring(resp.content).xpath('//a/@href'):
+        u = link if link.startswith('http') else urljoin(full, link)
+        if FILE_EXT_RE.search(u):
+            urls.append(u)
+    return tuple(urls)
+
+def fetch_external(full: str):
+    try:
+        urls = external_files(full)
+    except Exception as e:
+        forget(full)
+        gui_log(f"Error fetching external {full}: {e}")
+        return ()
+    if not urls:
+        mn = full.rstrip('/').rsplit('/', 1)[-1]
+        gui_log(f"No download for **{mn}**, logging.")
+        record_missing(mn)
+    return urls
+
+def first_visit(url: str) -> bool:
+    with seen_lock:
+        if url in seen_urls:
+            seen_urls.move_to_end(url)
+            return False
+        seen_urls[url] = None
+        if len(seen_urls) > SEEN_LIMIT:
+            seen_urls.popitem(last=False)
+    return True
+
+def forget(url: str):
+    with seen_lock:
+        seen_urls.pop(url, None)
+
+def process_urls(links):
+    is_file = FILE_EXT_RE.search
+    urls, external = [], []
+    for href in links:
         full = href if href.startswith('http') else urljoin(BASE_URL, href)
-        if full.lower().endswith(('.pdf', '.zip')):
-            upload_to_s3(full)
-        elif full.startswith(EXTERNAL_PREFIX) and is_allowed(full):
-            got_files = False
-            try:
-                resp = requests.get(full, headers={'User-Agent':USER_AGENT}, timeout=REQUEST_TIMEOUT)
-                resp.raise_for_status()
-                ext_soup = BeautifulSoup(resp.text, 'lxml')
-                for b in ext_soup.find_all('a', href=True):
-                    link = b['href']
-                    u = link if link.startswith('http') else urljoin(full, link)
-                    if u.lower().endswith(('.pdf', '.zip')):
-                        upload_to_s3(u)
-                        got_files = True
-                if not got_files:
-                    mn = os.path.basename(full.rstrip('/'))
-                    gui_log(f"No download for **{mn}**, logging.")
-                    record_missing(mn)
-            except Exception as e:
-                gui_log(f"Error fetching external {full}: {e}")
+        if is_file(full):
+            if not first_visit(full):
+                continue
+            filename = full.rsplit('/', 1)[-1]
+            if is_wanted(full, filename):
+                urls.append((full, filename))
+        elif full.startswith(EXTERNAL_PREFIX) and is_allowed(full) and first_visit(full):
+            external.append(full)
+
+    ext_futures = [EXECUTOR.submit(fetch_external, full) for full in external]
+    futures = [EXECUTOR.submit(upload_to_s3, u, filename) for u, filename in urls]
+    for fut in as_completed(ext_futures):
+        for u in fut.result():
+            if not first_visit(u):
+                continue
+            filename = u.rsplit('/', 1)[-1]
+            if is_wanted(u, filename):
+                futures.append(EXECUTOR.submit(upload_to_s3, u, filename))
+    for fut in futures:
+        fut.result()
 
 aws_key, aws_secret = load_credentials()
-s3 = boto3.client('s3', aws_access_key_id=aws_key, aws_secret_access_key=aws_secret)
-ALLOWED_IDS = load_allowed_ids()
-ALLOWED_PATTERNS = [ re.compile(rf'(?<![A-Za-z0-9]){re.escape(i)}(?![A-Za-z0-9])', re.IGNORECASE) for i in ALLOWED_IDS ]
-
-async def scraper_main():
+s3 = boto3.client('s3', aws_access_key_id=aws_key, aws_secret_access_key=aws_secret,
+                  config=BotoConfig(max_pool_connections=MAX_WORKERS * S3_CONCURRENCY))
+EXISTING_KEYS = list_existing_keys()
+KEYS_LOCK = threading.Lock()
+SESSION = requests.Session()
+SESSION.headers.update({'User-Agent': USER_AGENT})
+ADAPTER = HTTPAdapter(pool_connections=10, pool_maxsize=2 * MAX_WORKERS,
+                      max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]))
+SESSION.mount('https://', ADAPTER)
+SESSION.mount('http://', ADAPTER)
+S3_TRANSFER_CFG = TransferConfig(multipart_threshold=PART_SIZE, multipart_chunksize=16 << 20, max_concurrency=S3_CONCURRENCY, use_threads=True)
+EXECUTOR = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+LOOP = asyncio.new_event_loop()
+threading.Thread(target=LOOP.run_forever, daemon=True).start()
+ALLOWED_IDS = cached_allowed_ids()
+FILE_EXT_RE = re.compile(r'\.(?:pdf|zip)$', re.IGNORECASE)
+SKIP_RE = re.compile('|'.join(map(re.escape, SKIP_KEYWORDS)), re.IGNORECASE)
+TOKEN_RE = re.compile(r'[A-Za-z0-9]+')
+ALLOWED_TOKENS, SEPARATED_IDS = split_ids(ALLOWED_IDS)
+ALLOWED_PATTERN = re.compile(
+    r'(?<![A-Za-z0-9])' + trie_pattern(SEPARATED_IDS) + r'(?![A-Za-z0-9])'
+    if SEPARATED_IDS else r'(?!)', re.IGNORECASE)
+
+async def block_assets(route):
+    if route.request.resource_type in BLOCKED_RESOURCES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+async def open_browser(pw):
+    browser = await pw.chromium.launch(headless=True, args=['--disable-gpu', '--disable-dev-shm-usage'])
+    context = await browser.new_context(user_agent=USER_AGENT)
+    await context.route('**/*', block_assets)
+    return browser, await context.new_page()
+
+async def navigate(page, action):
+    async with page.expect_navigation(wait_until='domcontentloaded'):
+        await action()
+    await page.wait_for_selector(RESULTS_SELECTOR, state='attached')
+
+async def close_browser():
+    browser = pw_state.pop('browser', None)
+    if browser is not None:
+        try:
+            await browser.close()
+        except PlaywrightError:
+            pass
+
+async def get_page(restart=False):
+    if 'pw' not in pw_state:
+        pw_state['pw'] = await async_playwright().start()
+    browser = pw_state.get('browser')
+    if restart or browser is None or not browser.is_connected() or pw_state['page'].is_closed():
+        await close_browser()
+        pw_state['browser'], pw_state['page'] = await open_browser(pw_state['pw'])
+    return pw_state['page']
+
+async def scrape():
     open(MISSING_FILE, 'w').close()
+    seen_urls.clear()
     entry = urljoin(BASE_URL, ENTRY_PATH)
     gui_log("\n========================= ✓ Starting Scraper ✓ =========================\n")
     gui_log(f"🔗 Entering Webpage: {BASE_URL} 🔗\n")
-    async with async_playwright() as pw:
-        browser = await pw.chromium.launch(headless=False)
-        page = await browser.new_page(user_agent=USER_AGENT)
-
-        await page.goto(entry)
-        await page.wait_for_selector("form[name=searchForm]")
-        await page.wait_for_timeout(2000)
-        await page.evaluate("document.forms['searchForm'].submit()")
-        await page.wait_for_load_state('networkidle')
-        await page.wait_for_timeout(2000)
-
-        resume_page = get_resume_page()
-        if resume_page > 1:
-            gui_log(f"Resuming from page {resume_page} 🔄")
-            try:
-                await page.evaluate(f"goPage({resume_page}, 'display.asp')")
-            except PlaywrightError:
-                gui_log(f"⚠️ goPage not available for resuming at page {resume_page}")
-            await page.wait_for_load_state('networkidle')
-            await page.wait_for_timeout(2000)
-
-        soup0 = BeautifulSoup(await page.content(), 'lxml')
-        last = soup0.select_one("img[src*='last.gif']")
-        total = int(
-            re.search(r"goPage\(\s*(\d+)", last.parent['href']).group(1)
-            if last and last.parent and last.parent.has_attr('href') else 1
-        )
-        gui_log(f"📄 Total pages found: {total} 📄")
+    page = await get_page()
+
+    await page.goto(entry)
+    await page.wait_for_selector("form[name=searchForm]")
+    await navigate(page, lambda: page.evaluate("document.forms['searchForm'].submit()"))
 
+    resume_page = get_resume_page()
+    if resume_page > 1:
+        gui_log(f"Resuming from page {resume_page} 🔄")
+        try:
+            await navigate(page, lambda: page.evaluate(f"goPage({resume_page}, 'display.asp')"))
+        except PlaywrightError:
+            gui_log(f"⚠️ goPage not available for resuming at page {resume_page}")
+
+    total = await page.evaluate(TOTAL_PAGES_JS)
+    gui_log(f"📄 Total pages found: {total} 📄")
+
+    pending = []
+    try:
         for i in range(resume_page, total + 1):
             gui_log(f"\nScraping Page: {i}/{total} \n")
 
-            html = ""
+            links = []
             for attempt in range(2):
                 try:
-                    await page.wait_for_load_state('networkidle', timeout=15000)
-                    html = await page.content()
+                    await page.wait_for_selector(RESULTS_SELECTOR, state='attached', timeout=15000)
+                    links = await page.eval_on_selector_all("a[href]", "els => els.map(e => e.getAttribute('href'))")
                     break
                 except (PlaywrightTimeoutError, PlaywrightError) as e:
                     if attempt == 0:
@@ -186,18 +390,17 @@ async def scraper_main():
                         await asyncio.sleep(2)
                     else:
                         gui_log(f"Still failing to retrieve content for page {i}: {e}")
-            process(html)
-
-            now = datetime.now()
-            with open(RESUME_FILE, 'w') as f:
-                f.write(f"{i}, time: {now:%I:%M %p}, date: {now:%Y-%m-%d}")
+            pending.append((i, asyncio.create_task(asyncio.to_thread(process_urls, links))))
+            if len(pending) > 2:
+                done_page, task = pending.pop(0)
+                await task
+                write_resume(done_page)
+                flush_missing()
 
             if i < total:
                 next_page = i + 1
                 try:
-                    await page.evaluate(f"goPage({next_page}, 'display.asp')")
-                    await page.wait_for_load_state('networkidle')
-                    await page.wait_for_timeout(2000)
+                    await navigate(page, lambda: page.evaluate(f"goPage({next_page}, 'display.asp')"))
                     continue
                 except PlaywrightError as e:
                     gui_log(f"goPage eval failed for page {next_page}: {e}")
@@ -208,8 +411,7 @@ async def scraper_main():
                         href = await anchor.get_attribute('href')
                         nav_url = urljoin(BASE_URL, href)
                         await page.goto(nav_url)
-                        await page.wait_for_load_state('networkidle')
-                        await page.wait_for_timeout(2000)
+                        await page.wait_for_selector(RESULTS_SELECTOR, state='attached')
                         continue
                 except Exception as e:
                     gui_log(f"Anchor href navigation failed for page {next_page}: {e}")
@@ -217,9 +419,7 @@ async def scraper_main():
                 try:
                     anchor = await page.query_selector("a:has(img[src*='next.gif'])")
                     if anchor:
-                        await anchor.click()
-                        await page.wait_for_load_state('networkidle')
-                        await page.wait_for_timeout(2000)
+                        await navigate(page, lambda: anchor.evaluate("a => a.click()"))
                         continue
                 except Exception as e:
                     gui_log(f"Anchor click fallback failed for page {next_page}: {e}")
@@ -227,40 +427,58 @@ async def scraper_main():
                 try:
                     gui_log(f"Reloading and retrying goPage for {next_page}")
                     await page.reload()
-                    await page.wait_for_timeout(2000)
-                    await page.evaluate(f"goPage({next_page}, 'display.asp')")
-                    await page.wait_for_load_state('networkidle')
-                    await page.wait_for_timeout(2000)
+                    await page.wait_for_selector(RESULTS_SELECTOR, state='attached')
+                    await navigate(page, lambda: page.evaluate(f"goPage({next_page}, 'display.asp')"))
                     continue
                 except Exception as e:
                     gui_log(f"Reload fallback failed for page {next_page}: {e}")
 
+                try:
+                    gui_log(f"Re-entering search for page {next_page}")
+                    await page.goto(entry)
+                    await page.wait_for_selector("form[name=searchForm]")
+                    await navigate(page, lambda: page.evaluate("document.forms['searchForm'].submit()"))
+                    await navigate(page, lambda: page.evaluate(f"goPage({next_page}, 'display.asp')"))
+                    continue
+                except Exception as e:
+                    gui_log(f"Re-entering search failed for page {next_page}: {e}")
+
                 try:
                     gui_log(f"♻️ Restarting browser for page {next_page}")
-                    await browser.close()
-                    browser = await pw.chromium.launch(headless=False)
-                    page = await browser.new_page(user_agent=USER_AGENT)
+                    page = await get_page(restart=True)
                     await page.goto(entry)
                     await page.wait_for_selector("form[name=searchForm]")
-                    await page.evaluate("document.forms['searchForm'].submit()")
-                    await page.wait_for_load_state('networkidle')
-                    await page.wait_for_timeout(2000)
-                    await page.evaluate(f"goPage({next_page}, 'display.asp')")
-                    await page.wait_for_load_state('networkidle')
-                    await page.wait_for_timeout(2000)
+                    await navigate(page, lambda: page.evaluate("document.forms['searchForm'].submit()"))
+                    await navigate(page, lambda: page.evaluate(f"goPage({next_page}, 'display.asp')"))
                     continue
                 except Exception as e:
                     gui_log(f"Browser restart failed for page {next_page}: {e}")
 
                 gui_log(f"Cannot navigate to page {next_page}, stopping.")
                 break
-
-        await browser.close()
+    finally:
+        for done_page, task in pending:
+            await task
+            write_resume(done_page)
+        flush_missing()
     gui_log("======================= ✓ Scraping Complete ✓ =======================")
 
 
+async def scraper_main():
+    global scrape_lock
+    if scrape_lock is None:
+        scrape_lock = asyncio.Lock()
+    if scrape_lock.locked():
+        gui_log("Scraper already running, starting again once it finishes.")
+    async with scrape_lock:
+        try:
+            await scrape()
+        except Exception:
+            gui_log(f"Scraper stopped:\n{traceback.format_exc()}")
+            await close_browser()
+
 def run_scraper():
-    asyncio.run(scraper_main())
+    asyncio.run_coroutine_threadsafe(scraper_main(), LOOP)
 
 
 def start_gui():
@@ -281,7 +499,7 @@ def start_gui():
         btn_frame,
         text="Start Scraper",
         font=("Georgia", 10),
-        command=lambda: threading.Thread(target=run_scraper, daemon=True).start()
+        command=run_scraper
     ).pack(side=tk.LEFT, padx=5, ipadx=20, ipady=10)
 
     tk.Button(
@@ -299,20 +517,25 @@ def start_gui():
     log_widget.pack(fill=tk.BOTH, expand=True)
 
     def update_log():
-        while not log_queue.empty():
-            msg = log_queue.get()
-            parts = msg.split('**')
-            log_widget.config(state='normal')
+        chunks = []
+        for _ in range(LOG_BATCH):
+            try:
+                parts = log_queue.get_nowait().split('**')
+            except queue.Empty:
+                break
             for idx, part in enumerate(parts):
-                tag = 'bold' if idx % 2 else None
-                log_widget.insert(tk.END, part, tag)
-            log_widget.insert(tk.END, '\n')
+                chunks += [part, 'bold' if idx % 2 else ()]
+            chunks += ['\n', ()]
+        if chunks:
+            log_widget.config(state='normal')
+            log_widget.insert(tk.END, *chunks)
             log_widget.see(tk.END)
             log_widget.config(state='disabled')
-        root.after(100, update_log)
+        root.after(10 if not log_queue.empty() else 100, update_log)
 
     root.after(100, update_log)
     root.mainloop()
+    EXECUTOR.shutdown(wait=False, cancel_futures=True)
 
 if __name__ == '__main__':
     start_gui()
\ No newline at end of file